@@ -1,32 +1,121 @@
 import os
 import io
+import copy
+import sys
+import time
+import zlib
+import shutil
+import struct
+import subprocess
+import tarfile
 import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 try:
     import pyzipper  # type: ignore
 except ImportError:  # pragma: no cover
     pyzipper = None
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None
+try:
+    # Optional (pip install isal): SIMD-accelerated inflate and CRC-32
+    from isal import isal_zlib  # type: ignore
+except ImportError:  # pragma: no cover
+    isal_zlib = None
 from contextlib import contextmanager
-from typing import Iterator, Optional, Tuple
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
 ARC_KEY = 0x5A
+ARC_BUFSIZE = 1 << 20
+ZIP_BUFSIZE = 256 * 1024
+TAR_BUFSIZE = 4 << 20
+# Smaller than TAR_BUFSIZE: every header read after a seek refills the whole buffer
+TAR_FILE_BUFSIZE = 256 * 1024
+PARALLEL_MAX_FILE_SIZE = 16 * 1024 * 1024
+PARALLEL_INFLIGHT_BYTES = 256 * 1024 * 1024
+# WinZip AES: entries record method 99 in both headers and the real method in a 0x9901 extra block
+_WZ_AES_METHOD = 99
+# zlib.compress() accepts wbits (raw deflate) since Python 3.11.
+_ONESHOT_RAW_DEFLATE = sys.version_info >= (3, 11)
 
 try:
     ZIP_ZSTD = zipfile.ZIP_ZSTD  # type: ignore[attr-defined]
 except AttributeError:
     ZIP_ZSTD = None
 
+_crc32 = isal_zlib.crc32 if isal_zlib is not None else zlib.crc32
+
+# With ISA-L present, DEFLATE members are inflated and CRC-checked by it in both zipfile and
+# pyzipper. Compression stays on zlib: ISA-L only has levels 0-3 and would change the output.
+if isal_zlib is not None:
+    _zipfile_get_decompressor = zipfile._get_decompressor
+
+    def _isal_get_decompressor(compress_type):
+        if compress_type == zipfile.ZIP_DEFLATED:
+            return isal_zlib.decompressobj(-15)
+        return _zipfile_get_decompressor(compress_type)
+
+    zipfile._get_decompressor = _isal_get_decompressor
+    zipfile.crc32 = isal_zlib.crc32
+    if pyzipper is not None:
+        _pyzipper_get_decompressor = pyzipper.zipfile.ZipExtFile.get_decompressor
+
+        def _isal_pyzipper_get_decompressor(self, compress_type):
+            if compress_type == pyzipper.ZIP_DEFLATED:
+                return isal_zlib.decompressobj(-15)
+            return _pyzipper_get_decompressor(self, compress_type)
+
+        pyzipper.zipfile.ZipExtFile.get_decompressor = _isal_pyzipper_get_decompressor
+        pyzipper.zipfile.crc32 = isal_zlib.crc32
+
+INCOMPRESSIBLE_EXTS = frozenset({
+    '.zip', '.jpg', '.jpeg', '.png', '.mp3', '.mp4', '.mkv',
+    '.7z', '.gz', '.xz', '.zst', '.webp', '.avif',
+    '.jar', '.bz2', '.webm', '.flac', '.opus',
+})
+
 
 class XORFile(io.RawIOBase):
     def __init__(self, base: io.BufferedRandom, key: int = ARC_KEY):
         self._base = base
         self._key = key
+        self._table = bytes(b ^ key for b in range(256))
+        if np is not None:
+            self._key64 = np.uint64(int.from_bytes(bytes([key]) * 8, 'little'))
+
+    def _xor(self, data: bytes) -> bytes:
+        if np is not None:
+            buf = bytearray(data)
+            self._xor_inplace(memoryview(buf))
+            return bytes(buf)
+        return bytes(data).translate(self._table)
+
+    def _xor_inplace(self, view: memoryview) -> None:
+        if np is not None:
+            # Whole 8-byte words against the broadcast key, then the tail byte by byte.
+            head = len(view) & ~7
+            words = np.frombuffer(view[:head], dtype=np.uint64)
+            np.bitwise_xor(words, self._key64, out=words)
+            tail = np.frombuffer(view[head:], dtype=np.uint8)
+            np.bitwise_xor(tail, np.uint8(self._key), out=tail)
+        else:
+            view[:] = bytes(view).translate(self._table)
 
     def read(self, n: int = -1) -> bytes:  # noqa: D401
         data = self._base.read(n)
-        return bytes(b ^ self._key for b in data) if data else data
+        return self._xor(data) if data else data
+
+    def readinto(self, buf) -> int:  # noqa: D401
+        n = self._base.readinto(buf)
+        if n:
+            self._xor_inplace(memoryview(buf).cast('B')[:n])
+        return n
 
     def write(self, data: bytes) -> int:  # noqa: D401
-        return self._base.write(bytes(b ^ self._key for b in data))
+        return self._base.write(self._xor(data))
 
     def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:  # noqa: D401
         return self._base.seek(offset, whence)
@@ -38,6 +127,7 @@ class XORFile(io.RawIOBase):
         self._base.flush()
 
     def close(self) -> None:  # noqa: D401
+        super().close()
         self._base.close()
 
     def readable(self) -> bool:  # noqa: D401
@@ -53,19 +143,46 @@ class XORFile(io.RawIOBase):
         return self._base.truncate(size)
 
 
+@lru_cache(maxsize=256)
 def compression_for(path: str) -> int:
     if path.lower().endswith('.arc') and ZIP_ZSTD is not None:
         return ZIP_ZSTD
     return zipfile.ZIP_DEFLATED
 
 
+def entry_compression(path: str, file_path: str) -> int:
+    if os.path.splitext(file_path)[1].lower() in INCOMPRESSIBLE_EXTS:
+        return zipfile.ZIP_STORED
+    return compression_for(path)
+
+
+# Page-cache hint for one-pass rebuilds; a no-op where posix_fadvise is missing (Windows, macOS).
+def _fadvise(f, advice_name: str, offset: int = 0, length: int = 0) -> None:
+    advice = getattr(os, advice_name, None)
+    if advice is not None and hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(f.fileno(), offset, length, advice)
+
+
+# Starts kernel read-ahead of the archive tail, where the EOCD and (for most archives) the whole
+# central directory live, so the listing parse right after opening finds it in the page cache.
+# WILLNEED returns immediately; errors are ignored since this is only a hint.
+def prefetch_zip_directory(path: str, length: int = ZIP_BUFSIZE) -> None:
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            _fadvise(f, 'POSIX_FADV_WILLNEED', max(0, size - length), min(size, length))
+    except OSError:
+        pass
+
+
 @contextmanager
 
-def open_zip(path: str, mode: str = 'r') -> Iterator[Tuple[zipfile.ZipFile, Optional[None]]]:
+def open_zip(path: str, mode: str = 'r',
+             sequential: bool = False) -> Iterator[Tuple[zipfile.ZipFile, Optional[None]]]:
     is_arc = path.lower().endswith('.arc')
 
-    def _open_base(file_mode: str):
-        return open(path, file_mode)
+    def _open_base(file_mode: str, buffering: int = -1):
+        return open(path, file_mode, buffering=buffering)
 
     if is_arc:
         if mode == 'r':
@@ -76,17 +193,23 @@ def open_zip(path: str, mode: str = 'r') -> Iterator[Tuple[zipfile.ZipFile, Opti
             base = _open_base('r+b' if os.path.exists(path) else 'w+b')
         else:
             base = _open_base('r+b')
-        fileobj: io.RawIOBase = XORFile(base)
+        xorfile = XORFile(base)
+        if mode == 'r':
+            fileobj: io.BufferedIOBase = io.BufferedReader(xorfile, ARC_BUFSIZE)
+        else:
+            fileobj = io.BufferedRandom(xorfile, ARC_BUFSIZE)
     else:
         if mode == 'r':
-            base = _open_base('rb')
+            base = _open_base('rb', ZIP_BUFSIZE)
         elif mode == 'w':
-            base = _open_base('w+b')
+            base = _open_base('w+b', ZIP_BUFSIZE)
         elif mode == 'a':
-            base = _open_base('r+b' if os.path.exists(path) else 'w+b')
+            base = _open_base('r+b' if os.path.exists(path) else 'w+b', ZIP_BUFSIZE)
         else:
-            base = _open_base('r+b')
+            base = _open_base('r+b', ZIP_BUFSIZE)
         fileobj = base
+    if sequential:
+        _fadvise(base, 'POSIX_FADV_SEQUENTIAL')
 
     kwargs = {}
     comp = compression_for(path)
@@ -103,4 +226,526 @@ def open_zip(path: str, mode: str = 'r') -> Iterator[Tuple[zipfile.ZipFile, Opti
         yield zf, None
     finally:
         zf.close()
-        base.close()
\ No newline at end of file
+        if sequential:
+            # Done with these pages; don't let one rebuild push the rest of the cache out
+            fileobj.flush()
+            _fadvise(base, 'POSIX_FADV_DONTNEED')
+        fileobj.close()
+
+
+# tarfile.open() over a file with a larger buffer than the 8 KiB it would use on its own
+@contextmanager
+def open_tar(path: str, mode: str = 'r', **kwargs) -> Iterator[tarfile.TarFile]:
+    if mode == 'a' and not os.path.exists(path):
+        mode = 'w'  # as tarfile.open() itself does for a missing file
+    file_mode = {'r': 'rb', 'w': 'wb', 'a': 'r+b'}[mode]
+    with open(path, file_mode, buffering=TAR_FILE_BUFSIZE) as f:
+        with tarfile.open(fileobj=f, mode=mode, **kwargs) as tf:
+            yield tf
+
+
+# Appends an entry whose data is already compressed; CRC and sizes must be set on zinfo.
+def write_raw(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, chunks: Iterable[bytes]) -> None:
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    with zf._lock:
+        if zf._seekable:
+            zf.fp.seek(zf.start_dir)
+        zinfo.header_offset = zf.fp.tell()
+        checked = zinfo
+        if zinfo.compress_type == _WZ_AES_METHOD:
+            # Copying AES data as it is needs no codec, but zipfile's check would refuse method 99
+            checked = copy.copy(zinfo)
+            checked.compress_type = zipfile.ZIP_STORED
+        zf._writecheck(checked)
+        zf._didModify = True
+        zf.fp.write(zinfo.FileHeader(zip64))
+        for chunk in chunks:
+            zf.fp.write(chunk)
+        if zinfo.flag_bits & 0x08:
+            # FileHeader() leaves CRC and sizes zeroed for these, so they follow in a data descriptor
+            fmt = '<4sLQQ' if zip64 else '<4sLLL'
+            zf.fp.write(struct.pack(fmt, b'PK\x07\x08', zinfo.CRC, zinfo.compress_size, zinfo.file_size))
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+        zf.start_dir = zf.fp.tell()
+
+
+# Locates the end-of-central-directory record, skipping signature bytes that turn up inside
+# the archive comment; returns its offset and the record through the end of the file.
+def _find_eocd(f) -> Optional[Tuple[int, bytes]]:
+    size = f.seek(0, io.SEEK_END)
+    tail_start = max(0, size - (zipfile.sizeEndCentDir + zipfile.ZIP_MAX_COMMENT))
+    f.seek(tail_start)
+    tail = f.read()
+    idx = tail.rfind(zipfile.stringEndArchive)
+    while idx >= 0:
+        if len(tail) - idx >= zipfile.sizeEndCentDir:
+            comment_len, = struct.unpack_from('<H', tail, idx + 20)
+            if idx + zipfile.sizeEndCentDir + comment_len == len(tail):
+                return tail_start + idx, tail[idx:]
+        idx = tail.rfind(zipfile.stringEndArchive, 0, idx)
+    return None
+
+
+# Swaps the archive comment by rewriting just the EOCD tail, leaving entries and the central
+# directory alone; returns False if the record could not be located.
+def write_zip_comment(path: str, comment: bytes) -> bool:
+    comment = comment[:zipfile.ZIP_MAX_COMMENT]
+    base = open(path, 'r+b')
+    f = XORFile(base) if path.lower().endswith('.arc') else base
+    with f:
+        found = _find_eocd(f)
+        if found is None:
+            return False
+        f.seek(found[0] + 20)
+        f.write(struct.pack('<H', len(comment)) + comment)
+        f.truncate()
+    return True
+
+
+def _has_extra_block(extra: bytes, header_id: int) -> bool:
+    pos = 0
+    while pos + 4 <= len(extra):
+        block_id, size = struct.unpack_from('<HH', extra, pos)
+        if block_id == header_id:
+            return True
+        pos += 4 + size
+    return False
+
+
+# Renames entries by overwriting the name bytes in their local and central headers. Only works
+# when every new name encodes to the same number of bytes as the old one; returns False without
+# touching the file otherwise, or when the layout is ZIP64 or the headers disagree.
+def rename_entries_in_place(path: str, new_name: Callable[[str], str]) -> bool:
+    base = open(path, 'r+b')
+    f = XORFile(base) if path.lower().endswith('.arc') else base
+    with f:
+        found = _find_eocd(f)
+        if found is None:
+            return False
+        eocd_pos, eocd = found
+        endrec = struct.unpack(zipfile.structEndArchive, eocd[:zipfile.sizeEndCentDir])
+        cd_size, cd_offset = endrec[zipfile._ECD_SIZE], endrec[zipfile._ECD_OFFSET]
+        if cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF:
+            return False
+        cd_start = eocd_pos - cd_size
+        concat = cd_start - cd_offset
+        f.seek(cd_start)
+        cd = f.read(cd_size)
+        patches = []
+        pos = 0
+        while pos + zipfile.sizeCentralDir <= len(cd):
+            if cd[pos:pos + 4] != zipfile.stringCentralDir:
+                return False
+            flags, = struct.unpack_from('<H', cd, pos + 8)
+            name_len, extra_len, comment_len = struct.unpack_from('<3H', cd, pos + 28)
+            header_offset, = struct.unpack_from('<L', cd, pos + 42)
+            name_start = pos + zipfile.sizeCentralDir
+            old = bytes(cd[name_start:name_start + name_len])
+            encoding = 'utf-8' if flags & 0x800 else 'cp437'
+            name = old.decode(encoding)
+            renamed = new_name(name)
+            if renamed != name:
+                try:
+                    new = renamed.encode(encoding)
+                except UnicodeEncodeError:
+                    return False
+                extra = cd[name_start + name_len:name_start + name_len + extra_len]
+                # An Info-ZIP Unicode path field (0x7075) would keep announcing the old name
+                if (len(new) != len(old) or header_offset == 0xFFFFFFFF
+                        or _has_extra_block(extra, 0x7075)):
+                    return False
+                patches.append((header_offset + concat, cd_start + name_start, old, new))
+            pos = name_start + name_len + extra_len + comment_len
+        for local_offset, _, old, _ in patches:
+            f.seek(local_offset)
+            header = f.read(zipfile.sizeFileHeader + len(old))
+            if (header[:4] != zipfile.stringFileHeader
+                    or struct.unpack_from('<H', header, 26)[0] != len(old)
+                    or header[zipfile.sizeFileHeader:] != old):
+                return False
+            local_extra_len, = struct.unpack_from('<H', header, 28)
+            if _has_extra_block(f.read(local_extra_len), 0x7075):
+                return False
+        for local_offset, cd_name_offset, _, new in patches:
+            f.seek(local_offset + zipfile.sizeFileHeader)
+            f.write(new)
+            f.seek(cd_name_offset)
+            f.write(new)
+    return True
+
+
+# Reads the general-purpose flag of every central directory record straight from the file.
+# Returns None when the layout is not a plain (non-ZIP64) archive; callers then fall back to zipfile.
+def has_encrypted_entries(path: str) -> Optional[bool]:
+    if path.lower().endswith('.arc'):
+        f: io.BufferedIOBase = io.BufferedReader(XORFile(open(path, 'rb')), ARC_BUFSIZE)
+    else:
+        f = open(path, 'rb')
+    with f:
+        found = _find_eocd(f)
+        if found is None:
+            return None
+        eocd_pos, eocd = found
+        endrec = struct.unpack(zipfile.structEndArchive, eocd[:zipfile.sizeEndCentDir])
+        cd_size, cd_offset = endrec[zipfile._ECD_SIZE], endrec[zipfile._ECD_OFFSET]
+        if cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF:
+            return None
+        # Measure back from the EOCD so data prepended to the archive does not matter.
+        f.seek(eocd_pos - cd_size)
+        cd = f.read(cd_size)
+    pos = 0
+    while pos + zipfile.sizeCentralDir <= len(cd):
+        if cd[pos:pos + 4] != zipfile.stringCentralDir:
+            return None
+        flags, = struct.unpack_from('<H', cd, pos + 8)
+        if flags & 0x1:
+            return True
+        name_len, extra_len, comment_len = struct.unpack_from('<3H', cd, pos + 28)
+        pos += zipfile.sizeCentralDir + name_len + extra_len + comment_len
+    return False
+
+
+# zipfile and pyzipper report a missing or wrong password only as a RuntimeError; the message is
+# what tells it apart from their other RuntimeErrors (ZIP64 limits and the like).
+def is_password_error(exc: BaseException) -> bool:
+    return isinstance(exc, RuntimeError) and 'password' in str(exc).lower()
+
+
+# Yields the stored (compressed, possibly encrypted) bytes of an entry without decompressing them.
+def iter_raw(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, bufsize: int = ARC_BUFSIZE) -> Iterator[bytes]:
+    fp = zf.fp
+    with zf._lock:
+        fp.seek(zinfo.header_offset)
+        header = fp.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile("Bad magic number for file header")
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    pos = zinfo.header_offset + zipfile.sizeFileHeader + name_len + extra_len
+    remaining = zinfo.compress_size
+    while remaining:
+        with zf._lock:
+            fp.seek(pos)
+            chunk = fp.read(min(bufsize, remaining))
+        if not chunk:
+            raise EOFError
+        pos += len(chunk)
+        remaining -= len(chunk)
+        yield chunk
+
+
+# Copies an entry's stored bytes into another archive, optionally under a new name, with no
+# inflate/deflate round-trip. Encrypted entries stay encrypted with their original key.
+def copy_entry_raw(src: zipfile.ZipFile, dst: zipfile.ZipFile, zinfo: zipfile.ZipInfo,
+                   filename: Optional[str] = None) -> None:
+    if getattr(zinfo, 'wz_aes_vendor_id', None) is not None:
+        # pyzipper's AESZipInfo reports the inner method, which zipfile would then write into the
+        # central directory. A plain ZipInfo with method 99 keeps both headers as they were; the
+        # 0x9901 block is already in extra.
+        clone = zipfile.ZipInfo(zinfo.filename, zinfo.date_time)
+        for slot in zipfile.ZipInfo.__slots__:
+            if hasattr(zinfo, slot):
+                setattr(clone, slot, getattr(zinfo, slot))
+        clone.compress_type = _WZ_AES_METHOD
+    else:
+        clone = copy.copy(zinfo)
+    if filename is not None:
+        clone.filename = clone.orig_filename = filename
+    # The zip64 extra is regenerated by FileHeader() and _write_end_record() as needed
+    clone.extra = zipfile._strip_extra(zinfo.extra, (0x0001,))
+    write_raw(dst, clone, iter_raw(src, zinfo))
+
+
+# Writes already-compressed chunks through ZipFile.open(), skipping its compressor but not its
+# encrypter, so an AES pyzipper archive re-keys the data without a deflate pass.
+def write_precompressed(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, chunks: Iterable[bytes],
+                        crc: int, file_size: int) -> None:
+    zinfo.file_size = file_size
+    with zf.open(zinfo, 'w') as dst:
+        dst._compressor = None
+        for chunk in chunks:
+            dst.write(chunk)
+        dst._crc = crc
+        dst._file_size = file_size
+
+
+def _compress_file(file_path: str, compress_type: int, level: int) -> Tuple[bytes, int, int]:
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    crc = _crc32(data)
+    if compress_type == zipfile.ZIP_DEFLATED:
+        if _ONESHOT_RAW_DEFLATE:
+            return zlib.compress(data, level, -15), crc, len(data)
+        comp = zlib.compressobj(level, zlib.DEFLATED, -15)
+        return comp.compress(data) + comp.flush(), crc, len(data)
+    return data, crc, len(data)
+
+
+# Walks a directory tree with scandir, yielding (path, relative '/'-joined name, stat) for every
+# file. Like os.walk, symlinked directories are listed but not descended into (or yielded).
+def iter_files(root: str) -> Iterator[Tuple[str, str, os.stat_result]]:
+    stack: List[Tuple[str, str]] = [(root, '')]
+    while stack:
+        path, rel = stack.pop()
+        subdirs = []
+        with os.scandir(path) as it:
+            for entry in it:
+                name = rel + entry.name
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append((entry.path, name + '/'))
+                    continue
+                yield entry.path, name, entry.stat()
+        stack.extend(reversed(subdirs))
+
+
+# ZipInfo.from_file() without its os.stat() call, for stats already taken by iter_files
+def _zipinfo_from_stat(arcname: str, st: os.stat_result) -> zipfile.ZipInfo:
+    zinfo = zipfile.ZipInfo(arcname, time.localtime(st.st_mtime)[0:6])
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    zinfo.file_size = st.st_size
+    return zinfo
+
+
+# Writes (file_path, arcname, compress_type, stat) items, deflating files in worker threads;
+# stat may be None, in which case the file is stat'ed here.
+# Large files and methods other than STORED/DEFLATED go through ZipFile.write.
+# progress, if given, is called with the number of entries written so far.
+def write_files_parallel(zf: zipfile.ZipFile,
+                         items: Iterable[Tuple[str, str, int, Optional[os.stat_result]]],
+                         progress: Optional[Callable[[int], None]] = None) -> None:
+    level = zf.compresslevel if zf.compresslevel is not None else zlib.Z_DEFAULT_COMPRESSION
+    workers = os.cpu_count() or 1
+    pending: deque = deque()
+    inflight = 0
+    written = 0
+
+    def _done():
+        nonlocal written
+        written += 1
+        if progress is not None:
+            progress(written)
+
+    def _flush_one():
+        nonlocal inflight
+        zinfo, future = pending.popleft()
+        inflight -= zinfo.file_size
+        raw, zinfo.CRC, zinfo.file_size = future.result()
+        zinfo.compress_size = len(raw)
+        write_raw(zf, zinfo, (raw,))
+        _done()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for file_path, arcname, compress_type, st in items:
+            if st is None:
+                zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+            else:
+                zinfo = _zipinfo_from_stat(arcname, st)
+            if (compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+                    or zinfo.file_size > PARALLEL_MAX_FILE_SIZE):
+                zf.write(file_path, arcname, compress_type=compress_type)
+                _done()
+                continue
+            zinfo.compress_type = compress_type
+            pending.append((zinfo, pool.submit(_compress_file, file_path, compress_type, level)))
+            inflight += zinfo.file_size
+            while pending and (len(pending) > workers * 2 or inflight > PARALLEL_INFLIGHT_BYTES):
+                _flush_one()
+        while pending:
+            _flush_one()
+
+
+# Extracts members on a thread pool, each worker with its own ZipFile handle since a shared one
+# serialises every read on its lock; zlib drops the GIL while inflating.
+def extract_parallel(path: str, names: Iterable[str], dest: str, pwd: Optional[bytes] = None) -> None:
+    names = list(names)
+    workers = max(1, min(os.cpu_count() or 1, len(names)))
+
+    def _extract_batch(batch):
+        with open_zip(path, 'r') as (zf, _):
+            if pwd:
+                zf.setpassword(pwd)
+            for name in batch:
+                try:
+                    zf.extract(name, dest)
+                except FileExistsError:
+                    # Another worker created the same parent directory in between the
+                    # exists() check and makedirs() inside extract(); it is there now
+                    zf.extract(name, dest)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_extract_batch, names[i::workers]) for i in range(workers)]
+        for future in futures:
+            future.result()
+
+
+# Hands a whole-archive extraction to bsdtar (zip and tar) or Info-ZIP unzip (zip) when one is on
+# PATH. Returns False, having extracted nothing or only part, when there is no tool, the tool
+# fails, or the archive is one only Python can read (.arc, encrypted); the caller then falls back.
+# exclude holds exact member paths from the archive root, as the Python fallback compares them.
+def extract_native(path: str, dest: str, exclude: Iterable[str] = ()) -> bool:
+    low = path.lower()
+    is_zip = low.endswith('.zip')
+    if not (is_zip or low.endswith('.tar')):
+        return False
+    if is_zip and has_encrypted_entries(path) is not False:
+        return False
+    # Wildcards taken literally, as one-character classes both tools understand
+    exclude = [''.join('[%s]' % c if c in '*?[' else c for c in name) for name in exclude]
+    bsdtar = shutil.which('bsdtar')
+    unzip = shutil.which('unzip') if is_zip else None
+    if bsdtar:
+        cmd = [bsdtar, '-xf', path, '-C', dest]
+        for name in exclude:
+            # bsdtar matches an unanchored pattern at any directory level; '^' pins it to the root
+            cmd += ['--exclude', '^' + name]
+    elif unzip:
+        cmd = [unzip, '-o', '-qq', path, '-d', dest]
+        if exclude:
+            cmd += ['-x', *exclude]  # unzip matches against the whole path already
+    else:
+        return False
+    try:
+        result = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL,
+                                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+    except OSError:
+        return False
+    return result.returncode == 0
+
+
+# Descriptor of a file object whose positions are offsets in the file on disk, else None. A
+# compressed tar opened with mode 'r' reads through a GzipFile (or BZ2File, LZMAFile) whose
+# fileno() is that of the compressed file, so its positions must not be used on the descriptor.
+def _plain_fd(f) -> Optional[int]:
+    raw = getattr(f, 'raw', f)
+    return raw.fileno() if isinstance(raw, io.FileIO) else None
+
+
+# Copies length bytes from offset in src_f to dst_f's current position inside the kernel
+# (copy_file_range, else sendfile) where the platform and filesystems allow it; whatever that
+# could not move, e.g. sendfile to a non-socket on macOS or a compressed source, goes through
+# a buffer.
+def _copy_range(src_f, dst_f, offset: int, length: int) -> None:
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    sendfile = getattr(os, 'sendfile', None)
+    done = 0
+    if copy_file_range is not None or sendfile is not None:
+        src_fd, dst_fd = _plain_fd(src_f), _plain_fd(dst_f)
+        if src_fd is not None and dst_fd is not None:
+            dst_f.flush()
+            start = dst_f.tell()
+            try:
+                while done < length:
+                    if copy_file_range is not None:
+                        n = copy_file_range(src_fd, dst_fd, length - done, offset + done)
+                    else:
+                        n = sendfile(dst_fd, src_fd, offset + done, length - done)
+                    if not n:
+                        break
+                    done += n
+            except OSError:
+                pass
+            # Resync the buffered writer with the descriptor the kernel advanced
+            dst_f.seek(start + done)
+    if done < length:
+        src_f.seek(offset + done)
+        tarfile.copyfileobj(src_f, dst_f, length - done, bufsize=TAR_BUFSIZE)
+
+
+def _tar_padded(size: int) -> int:
+    blocks, remainder = divmod(size, tarfile.BLOCKSIZE)
+    return (blocks + (remainder > 0)) * tarfile.BLOCKSIZE
+
+
+# Appends a member to another tar by copying its header blocks (including any long-name/PAX
+# extension headers) and padded data verbatim, skipping TarInfo re-serialisation. Sparse members
+# and archives carrying PAX global headers, whose values copied headers would lose, are re-added.
+def copy_tar_member_raw(src: tarfile.TarFile, dst: tarfile.TarFile, member: tarfile.TarInfo) -> None:
+    if member.sparse is not None or src.pax_headers:
+        fileobj = src.extractfile(member) if member.isfile() else None
+        dst.addfile(member, fileobj)
+        if fileobj:
+            fileobj.close()
+        return
+    data_len = 0
+    if member.isreg() or member.type not in tarfile.SUPPORTED_TYPES:
+        data_len = _tar_padded(member.size)
+    length = member.offset_data + data_len - member.offset
+    _copy_range(src.fileobj, dst.fileobj, member.offset, length)
+    dst.offset += length
+    dst.members.append(member)
+
+
+# Like copy_tar_member_raw, but under a new name: only the header is re-serialised, the data
+# blocks are copied as they are. A PAX 'path' record would override the new name, so it is dropped.
+def copy_tar_member_renamed(src: tarfile.TarFile, dst: tarfile.TarFile, member: tarfile.TarInfo,
+                            name: str) -> None:
+    info = copy.copy(member)
+    info.name = name
+    info.pax_headers = {k: v for k, v in member.pax_headers.items() if k != 'path'}
+    if member.sparse is not None or src.pax_headers:
+        fileobj = src.extractfile(member) if member.isfile() else None
+        dst.addfile(info, fileobj)
+        if fileobj:
+            fileobj.close()
+        return
+    header = info.tobuf(dst.format, dst.encoding, dst.errors)
+    dst.fileobj.write(header)
+    dst.offset += len(header)
+    if member.isreg() or member.type not in tarfile.SUPPORTED_TYPES:
+        data_len = _tar_padded(member.size)
+        _copy_range(src.fileobj, dst.fileobj, member.offset_data, data_len)
+        dst.offset += data_len
+    dst.members.append(info)
+
+
+def _small_member_bytes(info: tarfile.TarInfo, data: bytes, tf: tarfile.TarFile) -> bytes:
+    return (info.tobuf(tf.format, tf.encoding, tf.errors) + data
+            + tarfile.NUL * (_tar_padded(len(data)) - len(data)))
+
+
+# Appends a small in-memory regular member with a single write, instead of addfile()'s copy
+# loop over a BytesIO.
+def add_small_member(tf: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    buf = _small_member_bytes(info, data, tf)
+    tf.fileobj.write(buf)
+    tf.offset += len(buf)
+    tf.members.append(info)
+
+
+# Replaces (or adds) a small regular member, such as the comment, without rebuilding the tar: in
+# place when the new header and data fill exactly the old member's blocks or it is the last one,
+# appended as the last one when it is missing. Returns False, leaving the file alone, when the tar is compressed,
+# the name occurs more than once or the member sits mid-archive and would change size.
+def write_tar_member_in_place(path: str, name: str, data: bytes) -> bool:
+    with open_tar(path, 'r') as tf:
+        if _plain_fd(tf.fileobj) is None:
+            return False  # member offsets are positions in the decompressed stream
+        members = tf.getmembers()
+        matches = [i for i, m in enumerate(members) if m.name == name]
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        body = _small_member_bytes(info, data, tf)
+    if not matches:
+        with open_tar(path, 'a') as tf:
+            add_small_member(tf, name, data)
+        return True
+    if len(matches) > 1 or not members[matches[0]].isreg():
+        return False
+    old = members[matches[0]]
+    is_last = matches[0] == len(members) - 1
+    old_len = old.offset_data + _tar_padded(old.size) - old.offset
+    if len(body) != old_len and not is_last:
+        return False
+    with open(path, 'r+b') as f:
+        f.seek(old.offset)
+        f.write(body)
+        if len(body) != old_len:
+            # New end of archive: two zero blocks, then zeros up to a whole record, as tarfile writes
+            end = old.offset + len(body) + 2 * tarfile.BLOCKSIZE
+            f.write(tarfile.NUL * (2 * tarfile.BLOCKSIZE + -end % tarfile.RECORDSIZE))
+            f.truncate()
+    return True
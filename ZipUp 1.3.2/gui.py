@@ -1,17 +1,27 @@
 import os
 import sys
 import json
+import atexit
+import stat
+import shutil
 import zipfile
 import tarfile
 import tempfile
 import subprocess
-from datetime import datetime
+import threading
+import time
 import typing
+from contextlib import ExitStack
 
 import wx
 
 from translations import get_translation
-from arc_utils import open_zip, compression_for
+from arc_utils import (open_zip, open_tar, entry_compression,
+                       write_files_parallel, iter_raw, write_precompressed, has_encrypted_entries,
+                       copy_entry_raw, extract_parallel, extract_native, write_zip_comment,
+                       rename_entries_in_place, copy_tar_member_raw, copy_tar_member_renamed,
+                       iter_files, prefetch_zip_directory, write_tar_member_in_place,
+                       add_small_member, is_password_error, pyzipper, TAR_BUFSIZE)
 
 try:
     _ZIP_ZSTD = zipfile.ZIP_ZSTD
@@ -19,6 +29,70 @@ except AttributeError:
     _ZIP_ZSTD = None
 
 
+# Archive member names always use '/', whatever os.sep is
+def _arcjoin(folder, name):
+    if not folder:
+        return name
+    return folder + name if folder.endswith('/') else folder + '/' + name
+
+
+def _stat_or_none(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+# (mtime_ns, size), or None once the file is gone
+def _file_stamp(path):
+    st = _stat_or_none(path)
+    return None if st is None else (st.st_mtime_ns, st.st_size)
+
+
+def _open_with_default_app(path):
+    if sys.platform.startswith('win'):
+        os.startfile(path)
+    elif sys.platform == 'darwin':
+        subprocess.Popen(['open', path])
+    else:
+        subprocess.Popen(['xdg-open', path])
+
+
+# Report-mode list that pulls cell text from a Python list instead of holding a copy of every row
+class ArchiveListCtrl(wx.ListCtrl):
+    def __init__(self, parent, style):
+        super().__init__(parent, style=style | wx.LC_VIRTUAL)
+        self.rows = []
+
+    def set_rows(self, rows):
+        # Unchanged contents (no-op write, refresh of the same folder): keep scroll and selection.
+        # Anything else resets, so a selection never lands on a row it wasn't made on
+        if rows == self.rows:
+            return
+        self.Freeze()
+        try:
+            self.DeleteAllItems()
+            self.rows = rows
+            self.SetItemCount(len(rows))
+            if rows:
+                self.RefreshItems(0, len(rows) - 1)
+        finally:
+            self.Thaw()
+
+    def OnGetItemText(self, item, col):
+        return self.rows[item][col]
+
+
+class FileDropTarget(wx.FileDropTarget):
+    def __init__(self, owner):
+        super().__init__()
+        self.owner = owner
+
+    def OnDropFiles(self, x, y, filenames):
+        self.owner.handle_drop(filenames)
+        return True
+
+
 class Archiver(wx.Frame):
     def __init__(self, parent, title):
        
@@ -34,9 +108,23 @@ class Archiver(wx.Frame):
         self.SetIcon(self.load_icon('archive.png', wx.ART_FILE_OPEN))
 
         self.archive_name = ""
+        self._archive_kind: typing.Optional[str] = None
         self.current_folder = ""
         
         self.zip_password: typing.Optional[bytes] = None
+        self._pwd_cache: typing.Dict[typing.Tuple[str, float], bool] = {}
+        self._entry_cache: typing.Optional[typing.Tuple[list, str]] = None
+        self._entry_cache_key: typing.Optional[typing.Tuple[str, int, int]] = None
+        self._tree: typing.Dict[str, dict] = {}
+        self._tree_source: typing.Optional[typing.Tuple[list, str]] = None
+        self._zip_reader: typing.Optional[zipfile.ZipFile] = None
+        self._zip_reader_key: typing.Optional[typing.Tuple[str, int, int]] = None
+        self._zip_reader_stack = ExitStack()
+        self._preview_dir: typing.Optional[str] = None
+        # (archive, entry) -> (archive stamp, extracted path, stamp of the extracted copy)
+        self._previews: typing.Dict[typing.Tuple[str, str], tuple] = {}
+        self._tool_enabled: typing.Dict[int, bool] = {}
+        self._busy = False
 
         self.panel = wx.Panel(self)
         self.panel.SetBackgroundColour(wx.Colour(245, 245, 245))
@@ -69,63 +157,69 @@ class Archiver(wx.Frame):
         if not self.archive_name or not self._is_zip_based():
             return False
         try:
-            with open_zip(self.archive_name, 'r') as (archive, _):
-                for info in archive.infolist():
-                    if info.flag_bits & 0x1:
-                        return True
-            return False
+            key = (self.archive_name, os.path.getmtime(self.archive_name))
+            if key not in self._pwd_cache:
+                encrypted = has_encrypted_entries(self.archive_name)
+                if encrypted is None:
+                    with open_zip(self.archive_name, 'r') as (archive, _):
+                        encrypted = next((True for info in archive.infolist() if info.flag_bits & 0x1), False)
+                self._pwd_cache[key] = encrypted
+            return self._pwd_cache[key]
         except Exception:
             return False
 
-    def set_archive_password(self, old_password=None, new_password=None):
-        if not self.archive_name or not self._is_zip_based():
-            return False
+    # Runs on a worker thread (see on_set_password); the caller posts the state changes back
+    def set_archive_password(self, archive_name, old_password=None, new_password=None):
+        temp_archive = archive_name + '.tmp'
         try:
-            temp_archive = self.archive_name + '.tmp'
-            
-            try:
-                import pyzipper
-                has_pyzipper = True
-            except ImportError:
-                has_pyzipper = False
-            
-            with open_zip(self.archive_name, 'r') as (old_archive, _):
+            has_pyzipper = pyzipper is not None
+
+            def _copy_entries(old_archive, new_archive, reuse_deflate=False):
+                for entry in old_archive.infolist():
+                    if entry.filename.endswith('/'):
+                        new_archive.writestr(entry.filename, b'')
+                        continue
+                    zinfo_cls = getattr(new_archive, 'zipinfo_cls', zipfile.ZipInfo)
+                    zinfo = zinfo_cls(entry.filename, date_time=entry.date_time)
+                    zinfo.compress_type = new_archive.compression
+                    zinfo.file_size = entry.file_size
+                    # Unencrypted deflate data can be encrypted as-is; no need to inflate and deflate again
+                    if (reuse_deflate and not entry.flag_bits & 0x1
+                            and entry.compress_type == zipfile.ZIP_DEFLATED == zinfo.compress_type):
+                        write_precompressed(new_archive, zinfo, iter_raw(old_archive, entry),
+                                            entry.CRC, entry.file_size)
+                        continue
+                    with old_archive.open(entry) as src, new_archive.open(zinfo, 'w') as dst:
+                        shutil.copyfileobj(src, dst, 1 << 20)
+
+            with open_zip(archive_name, 'r') as (old_archive, _):
                 if old_password:
                     old_archive.setpassword(old_password)
-                entries = old_archive.infolist()
-                data_map = {}
-                for entry in entries:
-                    if not entry.filename.endswith('/'):
-                        data_map[entry.filename] = old_archive.read(entry.filename)
-            
-            if has_pyzipper and new_password:
-                with pyzipper.AESZipFile(temp_archive, 'w', compression=pyzipper.ZIP_DEFLATED) as new_archive:
-                    new_archive.setpassword(new_password)
-                    new_archive.setencryption(pyzipper.WZ_AES)
-                    for entry in entries:
-                        if entry.filename.endswith('/'):
-                            new_archive.writestr(entry.filename, b'')
-                        else:
-                            new_archive.writestr(entry.filename, data_map[entry.filename])
-            else:
-                with open_zip(temp_archive, 'w') as (new_archive, _):
-                    if new_password:
+                if has_pyzipper and new_password:
+                    with pyzipper.AESZipFile(temp_archive, 'w', compression=pyzipper.ZIP_DEFLATED) as new_archive:
                         new_archive.setpassword(new_password)
-                    for entry in entries:
-                        if entry.filename.endswith('/'):
-                            new_archive.writestr(entry.filename, b'')
-                        else:
-                            new_archive.writestr(entry.filename, data_map[entry.filename])
+                        new_archive.setencryption(pyzipper.WZ_AES)
+                        _copy_entries(old_archive, new_archive, reuse_deflate=True)
+                else:
+                    with open_zip(temp_archive, 'w') as (new_archive, _):
+                        if new_password:
+                            new_archive.setpassword(new_password)
+                        _copy_entries(old_archive, new_archive)
             
-            import shutil
-            shutil.move(temp_archive, self.archive_name)
+            self._replace_archive(temp_archive, archive_name)
             return True
+        except RuntimeError:
+            if os.path.exists(temp_archive):
+                os.remove(temp_archive)
+            raise
         except Exception as e:
             if os.path.exists(temp_archive):
                 os.remove(temp_archive)
             return False
 
     def on_set_password(self, event):
+        if self._reject_if_busy():
+            return
         if not self.archive_name:
             self.show_error_dialog(self.get_translation("Сначала откройте архив."))
             return
@@ -146,14 +240,6 @@ class Archiver(wx.Frame):
             if dlg.ShowModal() == wx.ID_OK:
                 old_password = dlg.GetValue().encode()
                 dlg.Destroy()
-                try:
-                    with open_zip(self.archive_name, 'r') as (archive, _):
-                        archive.setpassword(old_password)
-                        archive.testzip()
-                except Exception:
-                    dlg.Destroy()
-                    self.show_error_dialog(self.get_translation("Неверный текущий пароль."))
-                    return
             else:
                 dlg.Destroy()
                 return
@@ -167,12 +253,26 @@ class Archiver(wx.Frame):
         if new_dlg.ShowModal() == wx.ID_OK:
             new_password = new_dlg.GetValue().encode()
             new_dlg.Destroy()
-            
-            if self.set_archive_password(old_password, new_password):
+            archive_name = self.archive_name
+
+            def _changed():
                 self.zip_password = new_password
-                self.show_info_dialog(self.get_translation("Пароль архива успешно изменён."))
-            else:
-                self.show_error_dialog(self.get_translation("Ошибка при установке пароля."))
+                self._pwd_cache.clear()
+
+            # Re-encrypting rewrites every entry, so it runs on the worker like the other rebuilds
+            def _work():
+                try:
+                    changed = self.set_archive_password(archive_name, old_password, new_password)
+                except RuntimeError as e:
+                    # Anything else (ZIP64 limits, the AES encrypter) keeps its own message
+                    if not is_password_error(e):
+                        raise
+                    raise RuntimeError(self.get_translation("Неверный текущий пароль.")) from None
+                if not changed:
+                    raise RuntimeError(self.get_translation("Ошибка при установке пароля."))
+                wx.CallAfter(_changed)
+
+            self._run_in_background(_work, self.get_translation("Пароль архива успешно изменён."))
         else:
             new_dlg.Destroy()
 
@@ -180,9 +280,16 @@ class Archiver(wx.Frame):
         if not os.path.exists(self.config_dir):
             os.makedirs(self.config_dir)
         self.language = 'ru'
+        # Opt-in: fsync rebuilt archives before they replace the original; costly on HDDs
+        self.durable_writes = False
+        try:
+            with open(self.config_path, encoding='utf-8') as f:
+                self.durable_writes = bool(json.load(f).get('durable_writes', False))
+        except (OSError, ValueError, AttributeError):
+            pass
 
     def save_config(self):
-        config = {'language': self.language}
+        config = {'language': self.language, 'durable_writes': self.durable_writes}
         try:
             with open(self.config_path, 'w', encoding='utf-8') as f:
                 json.dump(config, f, ensure_ascii=False, indent=4)
@@ -226,6 +333,8 @@ class Archiver(wx.Frame):
         self.toolsMenu.Append(wx.ID_ANY, self.get_translation("Установить пароль"), self.get_translation("Установить или изменить пароль архива"))
         self.toolsMenu.Append(wx.ID_ANY, self.get_translation("Обратная связь"), self.get_translation("Связь с разработчиком"))
 
+        # Add, extract, extract selected, create folder and set password: disabled while a job runs
+        self._tools_menu_ids = tuple(self.toolsMenu.FindItemByPosition(i).GetId() for i in range(5))
         self.Bind(wx.EVT_MENU, self.on_add_file_or_folder, id=self.toolsMenu.FindItemByPosition(0).GetId())
         self.Bind(wx.EVT_MENU, self.on_extract_all, id=self.toolsMenu.FindItemByPosition(1).GetId())
         self.Bind(wx.EVT_MENU, self.on_extract_selected, id=self.toolsMenu.FindItemByPosition(2).GetId())
@@ -250,23 +359,27 @@ class Archiver(wx.Frame):
         self.password_tool = toolbar.AddTool(wx.ID_ANY, self.get_translation("Пароль"), password_tool_icon, shortHelp=self.get_translation("Установить или изменить пароль архива"))
         comment_tool_icon = self.load_icon('comment.png', wx.ART_TIP)
         self.comment_tool = toolbar.AddTool(wx.ID_ANY, self.get_translation("Комментарий"), comment_tool_icon, shortHelp=self.get_translation("Комментарий к архиву"))
+        self.password_tool_id = self.password_tool.GetId()
+        self.comment_tool_id = self.comment_tool.GetId()
+        self.delete_tool_id = delete_tool.GetId()
+        self.search_tool_id = search_tool.GetId()
         toolbar.Realize()
 
         self.Bind(wx.EVT_TOOL, self.on_create_archive, id=wx.ID_NEW)
         self.Bind(wx.EVT_TOOL, self.on_select_archive, id=wx.ID_OPEN)
         self.Bind(wx.EVT_TOOL, self.on_add_file_or_folder, id=wx.ID_ADD)
         self.Bind(wx.EVT_TOOL, self.on_extract_all, id=wx.ID_EXECUTE)
-        self.Bind(wx.EVT_TOOL, self.on_search_file, id=search_tool.GetId())
-        self.Bind(wx.EVT_TOOL, self.delete_selected_file, id=delete_tool.GetId())
-        self.Bind(wx.EVT_TOOL, self.on_set_password, id=self.password_tool.GetId())
-        self.Bind(wx.EVT_TOOL, self.on_comment, id=self.comment_tool.GetId())
+        self.Bind(wx.EVT_TOOL, self.on_search_file, id=self.search_tool_id)
+        self.Bind(wx.EVT_TOOL, self.delete_selected_file, id=self.delete_tool_id)
+        self.Bind(wx.EVT_TOOL, self.on_set_password, id=self.password_tool_id)
+        self.Bind(wx.EVT_TOOL, self.on_comment, id=self.comment_tool_id)
         self.update_comment_button_state()
         self.update_password_button_state()
 
     def create_main_area(self):
         sizer = wx.BoxSizer(wx.HORIZONTAL)
         file_sizer = wx.BoxSizer(wx.VERTICAL)
-        self.list_ctrl = wx.ListCtrl(self.panel, style=wx.LC_REPORT | wx.BORDER_SUNKEN)
+        self.list_ctrl = ArchiveListCtrl(self.panel, style=wx.LC_REPORT | wx.BORDER_SUNKEN)
         self.list_ctrl.InsertColumn(0, self.get_translation("Имя файла/папки"), width=400)
         self.list_ctrl.InsertColumn(1, self.get_translation("Размер"), width=90)
         self.list_ctrl.InsertColumn(2, self.get_translation("Дата изменения"), width=120)
@@ -286,13 +399,6 @@ class Archiver(wx.Frame):
         self.list_ctrl.Bind(wx.EVT_CONTEXT_MENU, self.on_list_context_menu)
         self.list_ctrl.Bind(wx.EVT_KEY_DOWN, self.on_list_key_down)
 
-        class FileDropTarget(wx.FileDropTarget):
-            def __init__(self, owner):
-                super().__init__()
-                self.owner = owner
-            def OnDropFiles(self, x, y, filenames):
-                self.owner.handle_drop(filenames)
-                return True
         self.list_ctrl.SetDropTarget(FileDropTarget(self))
 
     def create_status_bar(self):
@@ -323,8 +429,7 @@ class Archiver(wx.Frame):
         dlg.Destroy()
 
     def on_item_double_click(self, event):
-        item = event.GetItem()
-        item_name = item.GetText()
+        item_name = self.list_ctrl.rows[event.GetIndex()][0]
         if item_name == '..':
             if self.current_folder:
                 parts = self.current_folder.rstrip('/').split('/')[:-1]
@@ -334,49 +439,72 @@ class Archiver(wx.Frame):
             self.update_file_list()
             return
         if item_name.endswith('/'):
-            self.current_folder = os.path.join(self.current_folder, item_name)
+            self.current_folder = _arcjoin(self.current_folder, item_name)
             if not self.current_folder.endswith('/'):
                 self.current_folder += '/'
             self.update_file_list()
             return
-        file_inside = os.path.join(self.current_folder, item_name)
+        file_inside = _arcjoin(self.current_folder, item_name)
+        key = (self.archive_name, file_inside)
+        archive_stamp = _file_stamp(self.archive_name)
+        cached = self._previews.get(key)
+        # Opened before and neither the archive nor the extracted copy has changed: skip the write
+        if cached is not None and cached[0] == archive_stamp and _file_stamp(cached[1]) == cached[2]:
+            _open_with_default_app(cached[1])
+            return
+        fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(item_name)[1], dir=self._get_preview_dir())
+        copied = False
         try:
-            if self._is_zip_based():
-                def _read(pwd):
-                    with open_zip(self.archive_name, 'r') as (archive, _):
-                        if pwd:
-                            archive.setpassword(pwd)
-                        return archive.read(file_inside)
-                try:
-                    data = _read(self.zip_password)
-                except RuntimeError:
-                    if self.prompt_zip_password():
-                        data = _read(self.zip_password)
-                    else:
-                        self.show_error_dialog('Файл защищён паролем.')
-                        return
-            elif self.archive_name.lower().endswith('.tar'):
-                with tarfile.open(self.archive_name, 'r') as archive:
-                    member = archive.getmember(file_inside)
-                    data = archive.extractfile(member).read() if member is not None else None
-            else:
-                data = None
-            if data is None:
-                return
-
-            fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(item_name)[1])
             with os.fdopen(fd, 'wb') as f:
-                f.write(data)
-            if sys.platform.startswith('win'):
-                os.startfile(tmp_path)
-            elif sys.platform == 'darwin':
-                subprocess.Popen(['open', tmp_path])
-            else:
-                subprocess.Popen(['xdg-open', tmp_path])
+                copied = self._copy_entry_to(file_inside, f)
+            if not copied:
+                return
+            self._previews[key] = (archive_stamp, tmp_path, _file_stamp(tmp_path))
+            _open_with_default_app(tmp_path)
         except RuntimeError:
             self.show_error_dialog('Файл защищён паролем.')
+        finally:
+            if not copied:
+                os.remove(tmp_path)
+
+    # One directory for every preview of the session, removed when the program exits
+    def _get_preview_dir(self):
+        if self._preview_dir is None:
+            self._preview_dir = tempfile.mkdtemp(prefix='archivator-')
+            atexit.register(shutil.rmtree, self._preview_dir, True)
+        return self._preview_dir
+
+    def _copy_entry_to(self, file_inside, dst):
+        if self._is_zip_based():
+            def _copy(pwd):
+                archive = self._get_zip_reader()
+                if pwd:
+                    archive.setpassword(pwd)
+                with archive.open(file_inside) as src:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+            try:
+                _copy(self.zip_password)
+            except RuntimeError:
+                if not self.prompt_zip_password():
+                    self.show_error_dialog('Файл защищён паролем.')
+                    return False
+                dst.seek(0)
+                dst.truncate()
+                _copy(self.zip_password)
+            return True
+        elif self._archive_kind == 'tar':
+            with open_tar(self.archive_name, 'r') as archive:
+                src = archive.extractfile(archive.getmember(file_inside))
+                if src is None:
+                    return False
+                with src:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+            return True
+        return False
 
     def on_create_folder(self, event):
+        if self._reject_if_busy():
+            return
         if not self.archive_name:
             self.show_error_dialog(self.get_translation("Сначала откройте архив."))
             return
@@ -387,39 +515,44 @@ class Archiver(wx.Frame):
                 try:
                     if self._is_zip_based():
                         with open_zip(self.archive_name, 'a') as (archive, _):
-                            archive.writestr(os.path.join(self.current_folder, folder_name), b'')
-                    elif self.archive_name.lower().endswith('.tar'):
-                        with tarfile.open(self.archive_name, 'a') as archive:
-                            archive.addfile(tarfile.TarInfo(os.path.join(self.current_folder, folder_name)))
+                            archive.writestr(_arcjoin(self.current_folder, folder_name), b'')
+                    elif self._archive_kind == 'tar':
+                        with open_tar(self.archive_name, 'a') as archive:
+                            archive.addfile(tarfile.TarInfo(_arcjoin(self.current_folder, folder_name)))
+                    self._invalidate_archive_cache()
                     self.show_info_dialog(f"{self.get_translation('Папка')} '{folder_name}' {self.get_translation('создана.')}" )
                     self.update_file_list()
                 except Exception as e:
                     self.show_error_dialog(str(e))
 
     def on_select_archive(self, event):
+        if self._reject_if_busy():
+            return
         wildcard = "Архивы (*.zip;*.tar;*.arc)|*.zip;*.tar;*.arc"
         with wx.FileDialog(self, self.get_translation("Выберите архив"), wildcard=wildcard, style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as fileDialog:
             if fileDialog.ShowModal() == wx.ID_CANCEL:
                 return
-            self.archive_name = fileDialog.GetPath()
+            self._set_archive(fileDialog.GetPath())
             self.current_folder = ""
             self.status_bar.SetStatusText(f"{self.get_translation('Открыт архив:')} {self.archive_name}")
             self.update_file_list()
 
     def on_create_archive(self, event):
+        if self._reject_if_busy():
+            return
         wildcard = "Архивы (*.zip;*.tar;*.arc)|*.zip;*.tar;*.arc"
         with wx.FileDialog(self, self.get_translation("Создать архив"), wildcard=wildcard, style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as fileDialog:
             if fileDialog.ShowModal() == wx.ID_CANCEL:
                 return
-            self.archive_name = fileDialog.GetPath()
+            self._set_archive(fileDialog.GetPath())
             self.current_folder = ""
             self.status_bar.SetStatusText(f"{self.get_translation('Создание архива:')} {self.archive_name}")
             try:
                 if self._is_zip_based():
                     with open_zip(self.archive_name, 'w') as (archive, _):
                         pass
-                elif self.archive_name.lower().endswith('.tar'):
-                    with tarfile.open(self.archive_name, 'w') as archive:
+                elif self._archive_kind == 'tar':
+                    with open_tar(self.archive_name, 'w') as archive:
                         pass
                 self.show_info_dialog(f"{self.get_translation('Архив')} {self.archive_name} {self.get_translation('создан.')}" )
             except Exception as e:
@@ -427,6 +560,8 @@ class Archiver(wx.Frame):
             self.update_file_list()
 
     def on_add_file_or_folder(self, event):
+        if self._reject_if_busy():
+            return
         if not self.archive_name:
             self.show_error_dialog(self.get_translation("Сначала откройте архив."))
             return
@@ -439,44 +574,112 @@ class Archiver(wx.Frame):
             with wx.FileDialog(self, self.get_translation("Выберите файл для добавления"), wildcard="*.*", style=wx.FD_OPEN | wx.FD_MULTIPLE) as fileDialog:
                 if fileDialog.ShowModal() == wx.ID_OK:
                     paths = fileDialog.GetPaths()
-                    try:
-                        if self._is_zip_based():
-                            with open_zip(self.archive_name, 'a') as (archive, _):
+                    archive_name, kind, folder = self.archive_name, self._archive_kind, self.current_folder
+
+                    def _work():
+                        if kind == 'zip':
+                            with open_zip(archive_name, 'a') as (archive, _):
                                 for file_path in paths:
-                                    arcname = os.path.join(self.current_folder, os.path.basename(file_path))
-                                    archive.write(file_path, arcname)
-                        elif self.archive_name.lower().endswith('.tar'):
-                            with tarfile.open(self.archive_name, 'a') as archive:
+                                    arcname = _arcjoin(folder, os.path.basename(file_path))
+                                    archive.write(file_path, arcname, compress_type=entry_compression(archive_name, file_path))
+                        elif kind == 'tar':
+                            with open_tar(archive_name, 'a') as archive:
                                 for file_path in paths:
-                                    archive.add(file_path, os.path.join(self.current_folder, os.path.basename(file_path)))
-                        self.show_info_dialog(self.get_translation("Файлы добавлены в архив."))
-                    except Exception as e:
-                        self.show_error_dialog(str(e))
+                                    archive.add(file_path, _arcjoin(folder, os.path.basename(file_path)))
+
+                    self._run_in_background(_work, self.get_translation("Файлы добавлены в архив."))
+                    return
         elif options == wx.CANCEL:
             with wx.DirDialog(self, self.get_translation("Выберите папку для добавления"), style=wx.DD_DEFAULT_STYLE) as dirDialog:
                 if dirDialog.ShowModal() == wx.ID_OK:
                     folder_path = dirDialog.GetPath()
-                    try:
-                        if self._is_zip_based():
-                            with open_zip(self.archive_name, 'a') as (archive, _):
-                                for root, dirs, files in os.walk(folder_path):
-                                    for file in files:
-                                        file_path = os.path.join(root, file)
-                                        arcname = os.path.relpath(file_path, start=folder_path)
-                                        archive.write(file_path, os.path.join(self.current_folder, arcname))
-                        elif self.archive_name.lower().endswith('.tar'):
-                            with tarfile.open(self.archive_name, 'a') as archive:
-                                for root, dirs, files in os.walk(folder_path):
-                                    for file in files:
-                                        file_path = os.path.join(root, file)
-                                        arcname = os.path.relpath(file_path, start=folder_path)
-                                        archive.add(file_path, os.path.join(self.current_folder, arcname))
-                        self.show_info_dialog(self.get_translation("Папка и файлы добавлены в архив."))
-                    except Exception as e:
-                        self.show_error_dialog(str(e))
+                    archive_name, kind, folder = self.archive_name, self._archive_kind, self.current_folder
+                    self._run_in_background(lambda: self._do_folder_add(archive_name, kind, folder, folder_path),
+                                            self.get_translation("Папка и файлы добавлены в архив."))
+                    return
         self.update_file_list()
 
+    # Nothing that writes to or switches the archive may start while a job runs: the job works on
+    # the path it was started with, and a second rewrite of the same file would race the first.
+    # Search is held back too: its listing would reopen the zip reader the job's os.replace()
+    # needs closed on Windows
+    def _set_busy(self, busy):
+        self._busy = busy
+        self.list_ctrl.Enable(not busy)
+        for tool_id in (wx.ID_NEW, wx.ID_OPEN, wx.ID_ADD, wx.ID_EXECUTE, self.delete_tool_id,
+                        self.search_tool_id):
+            self._enable_tool(tool_id, not busy)
+        for item_id in (wx.ID_NEW, wx.ID_OPEN) + self._tools_menu_ids:
+            self.menubar.Enable(item_id, not busy)
+        self.update_comment_button_state()
+        self.update_password_button_state()
+
+    # For the entry points _set_busy() cannot disable, such as drops and keyboard shortcuts
+    def _reject_if_busy(self):
+        if self._busy:
+            self.status_bar.SetStatusText(self.get_translation("Дождитесь завершения операции."))
+        return self._busy
+
+    def _report_added(self, count):
+        if count % 100 == 0:
+            wx.CallAfter(self.status_bar.SetStatusText, f"{self.get_translation('Добавлено файлов:')} {count}")
+
+    # Runs work() on a worker thread with the list and add actions disabled; the outcome dialog
+    # and the list refresh are posted back with wx.CallAfter. Read-only jobs (extraction) keep
+    # the caches; on_password_needed, if given, is posted instead of an error when the job failed
+    # for want of the right password.
+    def _run_in_background(self, work, done_message, error_prefix="", readonly=False,
+                           on_password_needed=None):
+        if not readonly:
+            self._close_zip_reader()
+        self._set_busy(True)
+        self.status_bar.SetStatusText(self.get_translation("Выполняется..."))
+
+        def _target():
+            retry = None
+            try:
+                work()
+                wx.CallAfter(self.show_info_dialog, done_message)
+            except RuntimeError as e:
+                if on_password_needed is not None and is_password_error(e):
+                    retry = on_password_needed
+                else:
+                    wx.CallAfter(self.show_error_dialog, error_prefix + str(e))
+            except zipfile.BadZipFile:
+                wx.CallAfter(self.show_error_dialog, error_prefix + self.get_translation("Некорректный zip файл."))
+            except Exception as e:
+                wx.CallAfter(self.show_error_dialog, error_prefix + str(e))
+            finally:
+                if not readonly:
+                    wx.CallAfter(self._invalidate_archive_cache)
+                wx.CallAfter(self._set_busy, False)
+                if readonly:
+                    wx.CallAfter(self.status_bar.SetStatusText, self.get_translation("Готово"))
+                else:
+                    wx.CallAfter(self.update_file_list)
+                # Posted last, so a retry job it starts is not cut short by the _set_busy(False) above
+                if retry is not None:
+                    wx.CallAfter(retry)
+
+        threading.Thread(target=_target, daemon=True).start()
+
+    # Runs on a worker thread (see _run_in_background); progress goes through wx.CallAfter.
+    def _do_folder_add(self, archive_name, kind, folder, folder_path):
+        prefix = (folder.rstrip('/') + '/') if folder else ''
+        if kind == 'zip':
+            items = [(file_path, prefix + rel, entry_compression(archive_name, file_path), st)
+                     for file_path, rel, st in iter_files(folder_path)]
+            with open_zip(archive_name, 'a') as (archive, _):
+                write_files_parallel(archive, items, progress=self._report_added)
+        elif kind == 'tar':
+            with open_tar(archive_name, 'a') as archive:
+                for count, (file_path, rel, _) in enumerate(iter_files(folder_path), 1):
+                    archive.add(file_path, prefix + rel)
+                    self._report_added(count)
+
     def on_extract_all(self, event):
+        if self._reject_if_busy():
+            return
         if not self.archive_name:
             self.show_error_dialog(self.get_translation("Сначала откройте архив."))
             return
@@ -484,37 +687,36 @@ class Archiver(wx.Frame):
             if dirDialog.ShowModal() == wx.ID_CANCEL:
                 return
             extract_path = dirDialog.GetPath()
+            names = []
+            if self._is_zip_based():
+                try:
+                    names = [entry[0] for entry in self._get_listing()[0]
+                             if entry[0] != '.archivator_comment.txt']
+                except zipfile.BadZipFile:
+                    self.show_error_dialog(self.get_translation("Некорректный zip файл."))
+                    return
+                except Exception as e:
+                    self.show_error_dialog(str(e))
+                    return
+            archive_name, kind = self.archive_name, self._archive_kind
+
             def _do_extract(pwd):
-                if self._is_zip_based():
-                    with open_zip(self.archive_name, 'r') as (archive, _):
-                        if pwd:
-                            archive.setpassword(pwd)
-                        for fi in archive.infolist():
-                            if fi.filename == '.archivator_comment.txt':
-                                continue
-                            archive.extract(fi, extract_path)
-                elif self.archive_name.lower().endswith('.tar'):
-                    with tarfile.open(self.archive_name, 'r') as archive:
+                if pwd is None and extract_native(archive_name, extract_path, ('.archivator_comment.txt',)):
+                    return
+                if kind == 'zip':
+                    extract_parallel(archive_name, names, extract_path, pwd)
+                elif kind == 'tar':
+                    with open_tar(archive_name, 'r', copybufsize=TAR_BUFSIZE) as archive:
                         for member in archive.getmembers():
                             if member.name == '.archivator_comment.txt':
                                 continue
                             archive.extract(member, extract_path)
-            try:
-                _do_extract(None)
-                self.show_info_dialog(f"{self.get_translation('Все файлы извлечены в')} {extract_path}.")
-            except RuntimeError:
-                if self.prompt_zip_password():
-                    try:
-                        _do_extract(self.zip_password)
-                        self.show_info_dialog(f"{self.get_translation('Все файлы извлечены в')} {extract_path}.")
-                    except Exception as e:
-                        self.show_error_dialog(str(e))
-                else:
-                    self.show_error_dialog('Файл защищён паролем.')
-            except zipfile.BadZipFile:
-                self.show_error_dialog(self.get_translation("Некорректный zip файл."))
+
+            self._extract_in_background(_do_extract, f"{self.get_translation('Все файлы извлечены в')} {extract_path}.")
 
     def on_extract_selected(self, event):
+        if self._reject_if_busy():
+            return
         if not self.archive_name:
             self.show_error_dialog(self.get_translation("Сначала откройте архив."))
             return
@@ -526,80 +728,84 @@ class Archiver(wx.Frame):
             if dirDialog.ShowModal() == wx.ID_CANCEL:
                 return
             extract_path = dirDialog.GetPath()
+            selected = self._selected_arcnames()
+            archive_name, kind = self.archive_name, self._archive_kind
 
             def _do_extract_selected(pwd):
-                if self._is_zip_based():
-                    with open_zip(self.archive_name, 'r') as (archive, _):
-                        if pwd:
-                            archive.setpassword(pwd)
-                        for index in range(self.list_ctrl.GetItemCount()):
-                            if self.list_ctrl.IsSelected(index):
-                                file_name = os.path.join(self.current_folder, self.list_ctrl.GetItemText(index))
-                                archive.extract(file_name, extract_path)
-                elif self.archive_name.lower().endswith('.tar'):
-                    with tarfile.open(self.archive_name, 'r') as archive:
-                        for index in range(self.list_ctrl.GetItemCount()):
-                            if self.list_ctrl.IsSelected(index):
-                                file_name = os.path.join(self.current_folder, self.list_ctrl.GetItemText(index))
-                                archive.extract(file_name, extract_path)
-            try:
-                _do_extract_selected(None)
-                self.show_info_dialog(f"{self.get_translation('Файлы извлечены в')} {extract_path}.")
-            except RuntimeError:
-                    if self.prompt_zip_password():
-                        try:
-                            _do_extract_selected(self.zip_password)
-                            self.show_info_dialog(f"{self.get_translation('Файлы извлечены в')} {extract_path}.")
-                        except Exception as e:
-                            self.show_error_dialog(str(e))
-                    else:
-                        self.show_error_dialog(self.get_translation('Файл защищён паролем.'))
-            except zipfile.BadZipFile:
-                self.show_error_dialog(self.get_translation("Некорректный zip файл."))
+                if kind == 'zip':
+                    extract_parallel(archive_name, selected, extract_path, pwd)
+                elif kind == 'tar':
+                    with open_tar(archive_name, 'r', copybufsize=TAR_BUFSIZE) as archive:
+                        for file_name in selected:
+                            archive.extract(file_name, extract_path)
+
+            self._extract_in_background(_do_extract_selected,
+                                        f"{self.get_translation('Файлы извлечены в')} {extract_path}.")
+
+    # Extraction on a worker thread; a missing or wrong password brings up the password prompt
+    # back on the UI thread and retries once with the new password. The other actions stay
+    # disabled while either attempt runs (_set_busy); the prompt in between is modal
+    def _extract_in_background(self, do_extract, done_message):
+        def _ask_password():
+            if self.prompt_zip_password():
+                pwd = self.zip_password
+                self._run_in_background(lambda: do_extract(pwd), done_message, readonly=True)
+            else:
+                self.show_error_dialog(self.get_translation('Файл защищён паролем.'))
+
+        self._run_in_background(lambda: do_extract(None), done_message, readonly=True,
+                                on_password_needed=_ask_password)
+
+    def _selected_indices(self):
+        index = self.list_ctrl.GetFirstSelected()
+        while index != -1:
+            yield index
+            index = self.list_ctrl.GetNextSelected(index)
+
+    def _selected_arcnames(self):
+        return frozenset(_arcjoin(self.current_folder, self.list_ctrl.rows[i][0])
+                         for i in self._selected_indices())
 
     def delete_selected_file(self, event):
+        if self._reject_if_busy():
+            return
         selected_items = self.list_ctrl.GetSelectedItemCount()
         if selected_items == 0:
             self.show_error_dialog(self.get_translation("Выберите файл для удаления."))
             return
-        selected_file_names = [
-            os.path.join(self.current_folder, self.list_ctrl.GetItemText(i))
-            for i in range(self.list_ctrl.GetItemCount())
-            if self.list_ctrl.IsSelected(i)
-        ]
+        selected_file_names = self._selected_arcnames()
         if wx.MessageBox(
             f"{self.get_translation('Вы уверены, что хотите удалить')} {len(selected_file_names)} {self.get_translation('файл(ов)?')}",
             self.get_translation("Удаление"),
             wx.YES_NO | wx.ICON_WARNING,
         ) == wx.NO:
             return
-        try:
-            if self._is_zip_based():
-                with open_zip(self.archive_name, 'r') as (archive, _):
-                    entries = [fi for fi in archive.infolist() if fi.filename not in selected_file_names]
-                    data = {fi.filename: archive.read(fi.filename) for fi in entries if not fi.filename.endswith('/')}
-                with open_zip(self.archive_name, 'w') as (new_arc, _):
-                    for fi in entries:
-                        if fi.filename.endswith('/'):
-                            new_arc.writestr(fi.filename, b'')
-                        else:
-                            new_arc.writestr(fi.filename, data[fi.filename])
-            elif self.archive_name.lower().endswith('.tar'):
-                with tarfile.open(self.archive_name, 'r') as archive, \
-                     tarfile.open(self.archive_name + '.tmp', 'w') as temp_tar:
+        archive_name, kind = self.archive_name, self._archive_kind
+
+        def _work():
+            if kind == 'zip':
+                temp_path = self._temp_archive_path(archive_name)
+                try:
+                    with open_zip(archive_name, 'r', sequential=True) as (archive, _), \
+                         open_zip(temp_path, 'w', sequential=True) as (new_arc, _):
+                        new_arc.comment = archive.comment
+                        for fi in archive.infolist():
+                            if fi.filename not in selected_file_names:
+                                copy_entry_raw(archive, new_arc, fi)
+                except Exception:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+                self._replace_archive(temp_path, archive_name)
+            elif kind == 'tar':
+                with open_tar(archive_name, 'r') as archive, \
+                     open_tar(archive_name + '.tmp', 'w', copybufsize=TAR_BUFSIZE) as temp_tar:
                     for member in archive.getmembers():
                         if member.name not in selected_file_names:
-                            if member.isfile():
-                                fileobj = archive.extractfile(member)
-                                temp_tar.addfile(member, fileobj)
-                                fileobj.close()
-                            else:
-                                temp_tar.addfile(member)
-                os.replace(self.archive_name + '.tmp', self.archive_name)
-            self.show_info_dialog(self.get_translation("Файлы удалены."))
-            self.update_file_list()
-        except Exception as e:
-            self.show_error_dialog(str(e))
+                            copy_tar_member_raw(archive, temp_tar, member)
+                self._replace_archive(archive_name + '.tmp', archive_name)
+
+        self._run_in_background(_work, self.get_translation("Файлы удалены."))
 
     def on_exit(self, event):
         self.Close(True)
@@ -616,84 +822,95 @@ class Archiver(wx.Frame):
     def read_archive_comment(self):
         if not self.archive_name:
             return ""
+        try:
+            # update_file_list has just built the listing, which carries the comment
+            return self._get_listing()[1]
+        except Exception:
+            return ""
+
+    # (name, name.lower(), size, date string, is_dir) for every entry plus the comment; the archive
+    # is only reparsed when it changed on disk or a write path dropped the cache
+    def _get_listing(self):
+        st = os.stat(self.archive_name)
+        key = (self.archive_name, st.st_mtime_ns, st.st_size)
+        if self._entry_cache is not None and self._entry_cache_key == key:
+            return self._entry_cache
+        entries = []
+        comment = ""
         if self._is_zip_based():
-            try:
-                with open_zip(self.archive_name, 'r') as (archive, _):
-                    comment = archive.comment.decode('utf-8', errors='ignore') if archive.comment else ""
-                    return comment
-            except Exception:
-                return ""
-        elif self.archive_name.lower().endswith('.tar'):
-            try:
-                with tarfile.open(self.archive_name, 'r') as archive:
-                    try:
-                        member = archive.getmember('.archivator_comment.txt')
-                        fileobj = archive.extractfile(member)
-                        if fileobj:
-                            comment = fileobj.read().decode('utf-8', errors='ignore')
-                            fileobj.close()
-                            return comment
-                    except KeyError:
-                        return ""
-            except Exception:
-                return ""
-        return ""
+            archive = self._get_zip_reader()
+            entries = [(fi.filename, fi.filename.lower(), fi.file_size,
+                        "%04d-%02d-%02d %02d:%02d:%02d" % fi.date_time, fi.filename.endswith('/'))
+                       for fi in archive.infolist()]
+            if archive.comment:
+                comment = archive.comment.decode('utf-8', errors='ignore')
+        elif self._archive_kind == 'tar':
+            # Members added together share an mtime, so each distinct one is formatted once
+            dates = {}
+            with open_tar(self.archive_name, 'r') as archive:
+                for fi in archive.getmembers():
+                    dt = dates.get(fi.mtime)
+                    if dt is None:
+                        dt = dates[fi.mtime] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(fi.mtime))
+                    entries.append((fi.name, fi.name.lower(), fi.size, dt, fi.isdir()))
+                    if fi.name == '.archivator_comment.txt' and fi.isfile():
+                        fileobj = archive.extractfile(fi)
+                        comment = fileobj.read().decode('utf-8', errors='ignore')
+                        fileobj.close()
+        self._entry_cache = (entries, comment)
+        self._entry_cache_key = key
+        return self._entry_cache
 
     def update_file_list(self):
-        self.list_ctrl.DeleteAllItems()
-        def insert_entry(name, size="", dt=None):
-            idx = self.list_ctrl.InsertItem(self.list_ctrl.GetItemCount(), name)
-            if size:
-                self.list_ctrl.SetItem(idx, 1, size)
-            if dt is not None:
-                self.list_ctrl.SetItem(idx, 2, dt.strftime("%Y-%m-%d %H:%M:%S"))
+        rows = []
         try:
-            entries = {}
-            if self._is_zip_based():
-                with open_zip(self.archive_name, 'r') as (archive, _):
-                    for fi in archive.infolist():
-                        if not fi.filename.startswith(self.current_folder):
-                            continue
-                        rel = fi.filename[len(self.current_folder):]
-                        if rel == "":
-                            continue
-                        parts = rel.split('/', 1)
-                        top = parts[0]
-                        if len(parts) == 1:
-                            entries[top] = (str(fi.file_size), datetime(*fi.date_time), False)
-                        else:
-                            folder_key = top + '/'
-                            if folder_key not in entries:
-                                entries[folder_key] = ("", None, True)
-            elif self.archive_name.lower().endswith('.tar'):
-                with tarfile.open(self.archive_name, 'r') as archive:
-                    for fi in archive.getmembers():
-                        if not fi.name.startswith(self.current_folder):
-                            continue
-                        rel = fi.name[len(self.current_folder):]
-                        if rel == "":
-                            continue
-                        parts = rel.split('/', 1)
-                        top = parts[0]
-                        if len(parts) == 1 and not fi.isdir():
-                            entries[top] = (str(fi.size), datetime.fromtimestamp(fi.mtime), False)
-                        else:
-                            folder_key = top + '/'
-                            if folder_key not in entries:
-                                entries[folder_key] = ("", None, True)
+            entries = self._get_tree().get(self.current_folder, {})
             if self.current_folder:
-                insert_entry('..')
-            for name, (size, dt, is_dir) in sorted(entries.items(), key=lambda x: (not x[1][2], x[0].lower())):
-                insert_entry(name, size, dt)
+                rows.append(('..', "", ""))
+            # Folders first, then case-insensitive; plain tuple comparison, no key callback per item
+            keyed = [(not is_dir, name.lower(), name, size, dt) for name, (size, dt, is_dir) in entries.items()]
+            keyed.sort()
+            rows.extend((name, size, dt) for _, _, name, size, dt in keyed)
             self.status_bar.SetStatusText(f"{self.get_translation('Файлы загружены из')} {self.archive_name}.")
         except Exception as e:
             self.show_error_dialog(str(e))
+        self.list_ctrl.set_rows(rows)
         comment = self.read_archive_comment()
         self.show_comment(comment)
         self.update_comment_button_state()
         self.update_password_button_state()
 
+    # {folder: {child: (size, date, is_dir)}} for every folder level, built in one pass over the
+    # cached listing so switching folders is a dict lookup instead of a scan of every entry
+    def _get_tree(self):
+        listing = self._get_listing()
+        if self._tree_source is listing:
+            return self._tree
+        tree = {}
+        for name, _, size, dt, is_dir in listing[0]:
+            folder = ''
+            start = 0
+            while True:
+                slash = name.find('/', start)
+                if slash == -1:
+                    leaf = name[start:]
+                    if leaf:
+                        children = tree.setdefault(folder, {})
+                        if is_dir:
+                            children.setdefault(leaf + '/', ("", "", True))
+                        else:
+                            children[leaf] = (str(size), dt, False)
+                    break
+                tree.setdefault(folder, {}).setdefault(name[start:slash + 1], ("", "", True))
+                folder = name[:slash + 1]
+                start = slash + 1
+        self._tree = tree
+        self._tree_source = listing
+        return tree
+
     def on_search_file(self, event):
+        if self._reject_if_busy():
+            return
         dialog = wx.TextEntryDialog(self, self.get_translation("Введите имя файла для поиска:"), self.get_translation("Поиск файла"), "")
         if dialog.ShowModal() == wx.ID_OK:
             search_text = dialog.GetValue().lower()
@@ -704,68 +921,106 @@ class Archiver(wx.Frame):
         if not self.archive_name:
             self.show_error_dialog(self.get_translation("Сначала откройте архив."))
             return
-        self.list_ctrl.DeleteAllItems()
+        rows = []
         try:
-            found = False
-            if self._is_zip_based():
-                with open_zip(self.archive_name, 'r') as (archive, _):
-                    for file_info in archive.infolist():
-                        if search_text in file_info.filename.lower():
-                            found = True
-                            display_name = file_info.filename[len(self.current_folder):] if self.current_folder else file_info.filename
-                            index = self.list_ctrl.InsertItem(self.list_ctrl.GetItemCount(), display_name)
-                            self.list_ctrl.SetItem(index, 1, str(file_info.file_size))
-                            date_time = datetime(*file_info.date_time)
-                            self.list_ctrl.SetItem(index, 2, date_time.strftime("%Y-%m-%d %H:%M:%S"))
-            elif self.archive_name.lower().endswith('.tar'):
-                with tarfile.open(self.archive_name, 'r') as archive:
-                    for file_info in archive.getmembers():
-                        if search_text in file_info.name.lower():
-                            found = True
-                            display_name = file_info.name[len(self.current_folder):] if self.current_folder else file_info.name
-                            index = self.list_ctrl.InsertItem(self.list_ctrl.GetItemCount(), display_name)
-                            self.list_ctrl.SetItem(index, 1, str(file_info.size))
-                            date_time = datetime.fromtimestamp(file_info.mtime)
-                            self.list_ctrl.SetItem(index, 2, date_time.strftime("%Y-%m-%d %H:%M:%S"))
-            if not found:
+            search_text = search_text.lower()
+            for name, name_lower, size, date_time, _ in self._get_listing()[0]:
+                if name_lower.find(search_text) >= 0:
+                    display_name = name[len(self.current_folder):] if self.current_folder else name
+                    rows.append((display_name, str(size), date_time))
+            self.list_ctrl.set_rows(rows)
+            if not rows:
                 self.show_info_dialog(self.get_translation("Файл не найден."))
         except Exception as e:
             self.show_error_dialog(str(e))
 
-    def _is_zip_based(self):
-        return self.archive_name.lower().endswith(('.zip', '.arc'))
+    # Everything that depends only on the path is worked out once here, not on every action
+    def _set_archive(self, path):
+        self._close_zip_reader()
+        self.archive_name = path
+        low = path.lower()
+        self._archive_kind = 'zip' if low.endswith(('.zip', '.arc')) else 'tar' if low.endswith('.tar') else None
+        if self._archive_kind == 'zip':
+            prefetch_zip_directory(path)
 
-    def _zip_compression(self):
-        return compression_for(self.archive_name)
+    def _is_zip_based(self):
+        return self._archive_kind == 'zip'
+
+    # Read-only handle reused while the archive is unchanged on disk, so read paths don't re-parse
+    # the central directory each time; only touched from the UI thread
+    def _get_zip_reader(self):
+        st = os.stat(self.archive_name)
+        key = (self.archive_name, st.st_mtime_ns, st.st_size)
+        if self._zip_reader is None or self._zip_reader_key != key:
+            self._close_zip_reader()
+            self._zip_reader, _ = self._zip_reader_stack.enter_context(open_zip(self.archive_name, 'r'))
+            self._zip_reader_key = key
+        return self._zip_reader
+
+    # Writers that os.replace() the archive drop the handle first; Windows won't replace an open file
+    def _close_zip_reader(self):
+        self._zip_reader_stack.close()
+        self._zip_reader = None
+
+    # Dropped after every write: the (mtime, size) keys miss a same-size rewrite that lands within
+    # the filesystem's timestamp granularity
+    def _invalidate_archive_cache(self):
+        self._entry_cache = None
+        self._close_zip_reader()
+
+    # Keeps the extension last so open_zip() still applies the .arc obfuscation to the temp file
+    def _temp_archive_path(self, archive_name):
+        root, ext = os.path.splitext(archive_name)
+        return root + '.tmp' + ext
+
+    # Swaps a rebuilt temp archive in over archive_name, the archive the job was started on rather
+    # than whatever is open now. With durable_writes the data, and on POSIX the rename, reach the
+    # disk first, so a crash leaves either the old or the complete new file
+    def _replace_archive(self, temp_path, archive_name):
+        if self.durable_writes:
+            with open(temp_path, 'r+b') as f:
+                os.fsync(f.fileno())
+        os.replace(temp_path, archive_name)
+        if self.durable_writes and os.name == 'posix':
+            fd = os.open(os.path.dirname(os.path.abspath(archive_name)), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
 
     def handle_drop(self, filenames):
+        if self._reject_if_busy():
+            return
         if not self.archive_name:
             self.show_error_dialog(self.get_translation("Сначала откройте архив."))
             return
-        try:
-            if self._is_zip_based():
-                with open_zip(self.archive_name, 'a') as (archive, _):
-                    for path in filenames:
-                        if os.path.isfile(path):
-                            arcname = os.path.join(self.current_folder, os.path.basename(path))
-                            archive.write(path, arcname)
-                        elif os.path.isdir(path):
-                            for root, _, files in os.walk(path):
-                                for file in files:
-                                    file_path = os.path.join(root, file)
-                                    arcname = os.path.relpath(file_path, start=path)
-                                    archive.write(file_path, os.path.join(self.current_folder, arcname))
-            elif self.archive_name.lower().endswith('.tar'):
-                with tarfile.open(self.archive_name, 'a') as archive:
+        archive_name, kind, folder = self.archive_name, self._archive_kind, self.current_folder
+
+        def _work():
+            if kind == 'zip':
+                paths = []
+                for path in filenames:
+                    st = _stat_or_none(path)
+                    if st is None:
+                        continue
+                    if stat.S_ISREG(st.st_mode):
+                        paths.append((path, _arcjoin(folder, os.path.basename(path)), st))
+                    elif stat.S_ISDIR(st.st_mode):
+                        for file_path, rel, file_st in iter_files(path):
+                            paths.append((file_path, _arcjoin(folder, rel), file_st))
+                # Largest first, so the big sequential writes don't trail behind an idle pool
+                paths.sort(key=lambda pa: pa[2].st_size, reverse=True)
+                with open_zip(archive_name, 'a') as (archive, _):
+                    write_files_parallel(archive, ((p, arc, entry_compression(archive_name, p), st)
+                                                   for p, arc, st in paths))
+            elif kind == 'tar':
+                with open_tar(archive_name, 'a', copybufsize=TAR_BUFSIZE) as archive:
                     for path in filenames:
-                        if os.path.isfile(path):
-                            archive.add(path, os.path.join(self.current_folder, os.path.basename(path)))
-                        elif os.path.isdir(path):
-                            archive.add(path, os.path.join(self.current_folder, os.path.basename(path)))
-            self.show_info_dialog(self.get_translation("Файлы добавлены в архив."))
-            self.update_file_list()
-        except Exception as e:
-            self.show_error_dialog(str(e))
+                        st = _stat_or_none(path)
+                        if st is not None and (stat.S_ISREG(st.st_mode) or stat.S_ISDIR(st.st_mode)):
+                            archive.add(path, _arcjoin(folder, os.path.basename(path)))
+
+        self._run_in_background(_work, self.get_translation("Файлы добавлены в архив."))
 
     def on_list_context_menu(self, event):
         menu = wx.Menu()
@@ -786,12 +1041,14 @@ class Archiver(wx.Frame):
         else:
             if not self._is_zip_based():
                 menu.Enable(password_item.GetId(), False)
-        self.Bind(wx.EVT_MENU, self.on_item_double_click, open_item)
-        self.Bind(wx.EVT_MENU, self.on_rename_file, rename_item)
-        self.Bind(wx.EVT_MENU, self.on_extract_selected, extract_item)
-        self.Bind(wx.EVT_MENU, self.delete_selected_file, delete_item)
-        self.Bind(wx.EVT_MENU, self.on_set_password, password_item)
-        self.Bind(wx.EVT_MENU, self.on_comment, comment_item)
+        # Bound on the popup itself, so the handlers go away with menu.Destroy() instead of piling
+        # up on the frame (where the stock IDs would also shadow the main menu's bindings)
+        menu.Bind(wx.EVT_MENU, self.on_item_double_click, id=open_item.GetId())
+        menu.Bind(wx.EVT_MENU, self.on_rename_file, id=rename_item.GetId())
+        menu.Bind(wx.EVT_MENU, self.on_extract_selected, id=extract_item.GetId())
+        menu.Bind(wx.EVT_MENU, self.delete_selected_file, id=delete_item.GetId())
+        menu.Bind(wx.EVT_MENU, self.on_set_password, id=password_item.GetId())
+        menu.Bind(wx.EVT_MENU, self.on_comment, id=comment_item.GetId())
         self.PopupMenu(menu)
         menu.Destroy()
 
@@ -813,6 +1070,8 @@ class Archiver(wx.Frame):
             event.Skip()
 
     def on_comment(self, event):
+        if self._reject_if_busy():
+            return
         if not self.archive_name:
             self.show_error_dialog(self.get_translation("Сначала откройте архив."))
             return
@@ -830,64 +1089,62 @@ class Archiver(wx.Frame):
         hbox.Add(btn_cancel, 0, wx.ALL, 10)
         vbox.Add(hbox, 0, wx.ALIGN_CENTER)
         dlg.SetSizer(vbox)
-        if dlg.ShowModal() == wx.ID_OK:
+        # Saved only if edited; OK on an unchanged comment would otherwise still rewrite the archive
+        if dlg.ShowModal() == wx.ID_OK and text_ctrl.GetValue() != comment:
             new_comment = text_ctrl.GetValue()
-            try:
-                self.save_archive_comment(new_comment)
-                self.show_comment(new_comment)
-                self.show_info_dialog(self.get_translation("Комментарий сохранён."))
-            except Exception as e:
-                self.show_error_dialog(self.get_translation("Ошибка при сохранении комментария: ") + str(e))
+            self.show_comment(new_comment)
+            archive_name, kind = self.archive_name, self._archive_kind
+            self._run_in_background(lambda: self.save_archive_comment(new_comment, archive_name, kind),
+                                    self.get_translation("Комментарий сохранён."),
+                                    self.get_translation("Ошибка при сохранении комментария: "))
         dlg.Destroy()
 
-    def save_archive_comment(self, comment):
-        if not self.archive_name:
+    # Runs on a worker thread (see _run_in_background), which drops the caches afterwards
+    def save_archive_comment(self, comment, archive_name, kind):
+        if not archive_name:
             return
-        if self._is_zip_based():
+        if kind == 'zip':
             try:
-                with open_zip(self.archive_name, 'a') as (archive, _):
-                    archive.comment = comment.encode('utf-8')
+                data = comment.encode('utf-8')
+                if not write_zip_comment(archive_name, data):
+                    with open_zip(archive_name, 'a') as (archive, _):
+                        archive.comment = data
             except Exception:
                 pass
-        elif self.archive_name.lower().endswith('.tar'):
-            import io
-            temp_path = self.archive_name + '.tmp'
-            with tarfile.open(self.archive_name, 'r') as archive, \
-                 tarfile.open(temp_path, 'w') as new_archive:
-                for member in archive.getmembers():
-                    if member.name == '.archivator_comment.txt':
-                        continue
-                    fileobj = archive.extractfile(member) if member.isfile() else None
-                    if fileobj:
-                        new_archive.addfile(member, fileobj)
-                        fileobj.close()
-                    else:
-                        new_archive.addfile(member)
-                comment_bytes = comment.encode('utf-8')
-                info = tarfile.TarInfo('.archivator_comment.txt')
-                info.size = len(comment_bytes)
-                new_archive.addfile(info, io.BytesIO(comment_bytes))
-            os.replace(temp_path, self.archive_name)
+        elif kind == 'tar':
+            comment_bytes = comment.encode('utf-8')
+            # Edited in place, or appended if there is none yet; rebuilt only when neither works.
+            # The comment is kept as the last member, where a later edit can always resize it in place
+            if write_tar_member_in_place(archive_name, '.archivator_comment.txt', comment_bytes):
+                return
+            temp_path = archive_name + '.tmp'
+            with open_tar(archive_name, 'r') as archive, \
+                 open_tar(temp_path, 'w', copybufsize=TAR_BUFSIZE) as new_archive:
+                for member in archive:
+                    if member.name != '.archivator_comment.txt':
+                        copy_tar_member_raw(archive, new_archive, member)
+                add_small_member(new_archive, '.archivator_comment.txt', comment_bytes)
+            self._replace_archive(temp_path, archive_name)
+
+    # EnableTool goes down to the native toolbar every time; skip it when nothing changes
+    def _enable_tool(self, tool_id, enabled):
+        if self._tool_enabled.get(tool_id) is not enabled:
+            self.GetToolBar().EnableTool(tool_id, enabled)
+            self._tool_enabled[tool_id] = enabled
 
     def update_comment_button_state(self):
         if hasattr(self, 'comment_tool'):
-            tb = self.GetToolBar()
-            if not self.archive_name:
-                tb.EnableTool(self.comment_tool.GetId(), False)
-            else:
-                tb.EnableTool(self.comment_tool.GetId(), True)
+            self._enable_tool(self.comment_tool_id, bool(self.archive_name) and not self._busy)
 
     def update_password_button_state(self):
         if hasattr(self, 'password_tool'):
-            tb = self.GetToolBar()
             # Кнопка доступна только для ZIP
-            if not self.archive_name or not self._is_zip_based():
-                tb.EnableTool(self.password_tool.GetId(), False)
-            else:
-                tb.EnableTool(self.password_tool.GetId(), True)
+            self._enable_tool(self.password_tool_id,
+                              bool(self.archive_name) and self._is_zip_based() and not self._busy)
 
     def on_rename_file(self, event):
-        
+        if self._reject_if_busy():
+            return
         if not self.archive_name:
             self.show_error_dialog(self.get_translation("Сначала откройте архив."))
             return
@@ -902,7 +1159,7 @@ class Archiver(wx.Frame):
 
     
         selected_index = self.list_ctrl.GetFirstSelected()
-        old_display_name = self.list_ctrl.GetItemText(selected_index)
+        old_display_name = self.list_ctrl.rows[selected_index][0]
 
     
         if old_display_name in ("..", ""):
@@ -928,73 +1185,64 @@ class Archiver(wx.Frame):
         if not new_name_input or new_name_input == old_display_name:
             return
 
-        old_full = os.path.join(self.current_folder, old_display_name)
-        new_full = os.path.join(self.current_folder, new_name_input)
-
-        try:
-            if self._is_zip_based():
-               
-                with open_zip(self.archive_name, 'r') as (archive, _):
-                    entries = archive.infolist()
-                    data_map = {}
-                    for fi in entries:
-                        if fi.filename.endswith('/'):
-                            continue  
-                        data_map[fi.filename] = archive.read(fi.filename)
-
-             
-                if new_full in [fi.filename for fi in entries]:
-                    self.show_error_dialog(self.get_translation("Файл с таким именем уже существует."))
-                    return
+        old_full = _arcjoin(self.current_folder, old_display_name)
+        new_full = _arcjoin(self.current_folder, new_name_input)
 
-                with open_zip(self.archive_name, 'w') as (new_arc, _):
-                    for fi in entries:
-                        original_name = fi.filename
-                        if is_dir:
-                            if original_name.startswith(old_full):
-                                replaced_name = new_full + original_name[len(old_full):]
-                            else:
-                                replaced_name = original_name
-                        else:
-                            replaced_name = new_full if original_name == old_full else original_name
+        if self._is_zip_based():
+            try:
+                existing = {entry[0] for entry in self._get_listing()[0]}
+            except Exception as e:
+                self.show_error_dialog(str(e))
+                return
+            if new_full in existing:
+                self.show_error_dialog(self.get_translation("Файл с таким именем уже существует."))
+                return
+        elif not self._archive_kind == 'tar':
+            self.show_error_dialog(self.get_translation("Неподдерживаемый формат архива."))
+            return
 
-                        if original_name.endswith('/'):
-                            new_arc.writestr(replaced_name, b'')
-                        else:
-                            new_arc.writestr(replaced_name, data_map[original_name])
+        def _renamed(original_name):
+            if is_dir:
+                if original_name.startswith(old_full):
+                    return new_full + original_name[len(old_full):]
+                return original_name
+            return new_full if original_name == old_full else original_name
+        archive_name, kind = self.archive_name, self._archive_kind
+
+        def _work():
+            if kind == 'zip':
+                # Same-length names are patched in the headers; anything else rebuilds the archive
+                if rename_entries_in_place(archive_name, _renamed):
+                    return
+                temp_path = self._temp_archive_path(archive_name)
+                with open_zip(archive_name, 'r', sequential=True) as (archive, _):
+                    entries = archive.infolist()
+                    try:
+                        with open_zip(temp_path, 'w', sequential=True) as (new_arc, _):
+                            new_arc.comment = archive.comment
+                            for fi in entries:
+                                copy_entry_raw(archive, new_arc, fi, _renamed(fi.filename))
+                    except Exception:
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+                        raise
+                self._replace_archive(temp_path, archive_name)
 
-            elif self.archive_name.lower().endswith('.tar'):
-                temp_path = self.archive_name + '.tmp'
-                with tarfile.open(self.archive_name, 'r') as archive, \
-                     tarfile.open(temp_path, 'w') as new_archive:
+            else:
+                temp_path = archive_name + '.tmp'
+                with open_tar(archive_name, 'r') as archive, \
+                     open_tar(temp_path, 'w', copybufsize=TAR_BUFSIZE) as new_archive:
 
                     for member in archive.getmembers():
-                        original_name = member.name
-
-                        if is_dir:
-                            if original_name.startswith(old_full):
-                                member.name = new_full + original_name[len(old_full):]
-                        else:
-                            if original_name == old_full:
-                                member.name = new_full
-
-                        fileobj = archive.extractfile(member) if member.isfile() else None
-                        if fileobj:
-                            new_archive.addfile(member, fileobj)
-                            fileobj.close()
+                        renamed = _renamed(member.name)
+                        if renamed == member.name:
+                            copy_tar_member_raw(archive, new_archive, member)
                         else:
-                            new_archive.addfile(member)
+                            copy_tar_member_renamed(archive, new_archive, member, renamed)
 
-                os.replace(temp_path, self.archive_name)
+                self._replace_archive(temp_path, archive_name)
 
-            else:
-                self.show_error_dialog(self.get_translation("Неподдерживаемый формат архива."))
-                return
-
-            self.show_info_dialog(self.get_translation("Файл переименован."))
-            self.update_file_list()
-        except Exception as e:
-            self.show_error_dialog(str(e))
+        self._run_in_background(_work, self.get_translation("Файл переименован."))
 
     def format_size(self, size):
         if size >= 1024 ** 3:
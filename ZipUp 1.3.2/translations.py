@@ -34,6 +34,9 @@ translations = {
     "Выберите файл для удаления.": "Выберите файл для удаления.",
     "Файлы удалены.": "Файлы удалены.",
     "Папка и файлы добавлены в архив.": "Папка и файлы добавлены в архив.",
+    "Добавлено файлов:": "Добавлено файлов:",
+    "Выполняется...": "Выполняется...",
+    "Дождитесь завершения операции.": "Дождитесь завершения операции.",
     "Введите имя файла для поиска:": "Введите имя файла для поиска:",
     "Создать новый архив": "Создать новый архив",
     "Открыть существующий архив": "Открыть существующий архив",